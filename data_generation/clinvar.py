@@ -1,114 +1,220 @@
 import lxml.etree as ET
 import csv
+import mmap
+import os
+import shutil
+import tempfile
+from multiprocessing import Pool
 
 XML_FILE = "ClinVarVariationRelease.xml"
 OUT_FILE = "clinvar_extracted.csv"
 
-def get_text(elem, path):
-    found = elem.find(path)
-    return found.text if found is not None else None
-
-def get_attr(elem, path, attr):
-    found = elem.find(path)
-    return found.get(attr) if found is not None else None
-
-with open(OUT_FILE, "w", newline="") as f:
-    writer = csv.writer(f)
-    writer.writerow([
-        "variation_id",
-        "rs_id",
-        "gene",
-        "variant_type",
-        "consequence",
-        "chromosome",
-        "position",
-        "clinical_sig",
-        "disease_name",
-        "species",
-        "mim_gene",
-        "mim_disease"
-    ])
-
+WRITE_BATCH_SIZE = 10000
+N_WORKERS = os.cpu_count() or 1
+
+RECORD_OPEN = b"<VariationArchive"
+RECORD_CLOSE = b"</VariationArchive>"
+READ_SIZE = 1 << 20
+
+COLUMNS = [
+    "variation_id",
+    "rs_id",
+    "gene",
+    "variant_type",
+    "consequence",
+    "chromosome",
+    "position",
+    "clinical_sig",
+    "disease_name",
+    "species",
+    "mim_gene",
+    "mim_disease"
+]
+
+# Only these tags carry fields we extract; filtering on them lets lxml skip
+# every other element of a VariationArchive in C during the single walk.
+FIELD_TAGS = (
+    "Species",
+    "Gene",
+    "VariantType",
+    "MolecularConsequence",
+    "SequenceLocation",
+    "XRef",
+    "Description",
+    "ElementValue",
+    "OMIM",
+)
+
+def in_disease_trait(elem):
+    for trait in elem.iterancestors("Trait"):
+        if trait.get("Type") == "Disease":
+            return True
+    return False
+
+def extract_record(va):
+    """Collect all output fields from a VariationArchive in one tree walk.
+
+    Each field keeps the first match in document order, as the previous
+    per-field find()/findall() lookups did.
+    """
+    fields = {"variation_id": va.get("VariationID")}
+
+    for el in va.iter(FIELD_TAGS):
+        tag = el.tag
+        parent_tag = el.getparent().tag
+
+        if tag == "XRef":
+            db = el.get("DB")
+            if db == "dbSNP":
+                if "rs_id" not in fields:
+                    fields["rs_id"] = el.get("ID")
+            elif db == "OMIM" and el.get("Type") == "MIM":
+                if "mim_disease" not in fields:
+                    fields["mim_disease"] = el.get("ID")
+        elif tag == "SequenceLocation":
+            if "chromosome" not in fields and el.get("Assembly") == "GRCh38":
+                fields["chromosome"] = el.get("Chr")
+                fields["position"] = el.get("start")
+        elif tag == "ElementValue":
+            if ("disease_name" not in fields
+                    and el.get("Type") == "Preferred"
+                    and in_disease_trait(el)):
+                fields["disease_name"] = el.text
+        elif tag == "Gene":
+            if "gene" not in fields and parent_tag == "GeneList":
+                fields["gene"] = el.get("Symbol")
+        elif tag == "OMIM":
+            if "mim_gene" not in fields and parent_tag == "Gene":
+                fields["mim_gene"] = el.text
+        elif tag == "MolecularConsequence":
+            if "consequence" not in fields:
+                fields["consequence"] = el.get("Type")
+        elif tag == "VariantType":
+            if "variant_type" not in fields and parent_tag == "SimpleAllele":
+                fields["variant_type"] = el.text
+        elif tag == "Description":
+            if ("clinical_sig" not in fields
+                    and parent_tag == "GermlineClassification"
+                    and el.getparent().getparent().tag == "Classifications"):
+                fields["clinical_sig"] = el.text
+        elif tag == "Species":
+            if "species" not in fields and parent_tag == "VariationArchive":
+                fields["species"] = el.text
+
+    return [fields.get(column) for column in COLUMNS]
+
+def parse_records(source, writer):
     context = ET.iterparse(
-        XML_FILE,
+        source,
         events=("end",),
-        tag="VariationArchive"
+        tag="VariationArchive",
+        huge_tree=False,
+        remove_blank_text=True,
+        remove_comments=True
     )
 
+    root = None
+    batch = []
     for _, va in context:
-        variation_id = va.get("VariationID")
-
-        species = get_text(va, "Species")
-
-        gene = get_attr(
-            va,
-            ".//GeneList/Gene",
-            "Symbol"
-        )
-
-        variant_type = get_text(
-            va,
-            ".//SimpleAllele/VariantType"
-        )
-
-        consequence = get_attr(
-            va,
-            ".//MolecularConsequence",
-            "Type"
-        )
-
-        chrom = None
-        pos = None
-        for loc in va.findall(".//SequenceLocation"):
-            if loc.get("Assembly") == "GRCh38":
-                chrom = loc.get("Chr")
-                pos = loc.get("start")
-                break
-
-        rs_id = None
-        for x in va.findall(".//XRef"):
-            if x.get("DB") == "dbSNP":
-                rs_id = x.get("ID")
-                break
-
-        clinical_sig = get_text(
-            va,
-            ".//Classifications/GermlineClassification/Description"
-        )
-
-        # --- Disease name (Preferred) ---
-        disease_name = None
-        for ev in va.findall(".//Trait[@Type='Disease']//ElementValue"):
-            if ev.get("Type") == "Preferred":
-                disease_name = ev.text
+        batch.append(extract_record(va))
+        if len(batch) >= WRITE_BATCH_SIZE:
+            writer.writerows(batch)
+            batch.clear()
+
+        # Every earlier record has already been dropped, so the finished
+        # one is always the root's first child and a single delete keeps
+        # the tree flat. Don't root.clear() here: the parser reads ahead,
+        # so the root may already hold the next, unprocessed records.
+        if root is None:
+            root = va.getparent()
+        va.clear(keep_tail=True)
+        del root[0]
+
+    writer.writerows(batch)
+
+class RangeReader:
+    """File-like view of bytes [start, end) wrapped in the document's root tags.
+
+    Lets iterparse stream one partition of the release without loading it.
+    """
+
+    def __init__(self, f, start, end, prefix, suffix):
+        f.seek(start)
+        self.f = f
+        self.remaining = end - start
+        self.prefix = prefix
+        self.suffix = suffix
+
+    def read(self, size=READ_SIZE):
+        if self.prefix:
+            data, self.prefix = self.prefix, b""
+            return data
+        if self.remaining > 0:
+            data = self.f.read(min(size, self.remaining))
+            if data:
+                self.remaining -= len(data)
+                return data
+            self.remaining = 0
+        data, self.suffix = self.suffix, b""
+        return data
+
+def find_partitions(path, n_parts):
+    """Split the release into byte ranges that start on a VariationArchive.
+
+    Returns the text before the first record (XML declaration and root
+    open tag, needed to parse each range on its own) and the ranges.
+    """
+    with open(path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        first = mm.find(RECORD_OPEN)
+        if first == -1:
+            return mm[:], []
+        end = mm.rfind(RECORD_CLOSE) + len(RECORD_CLOSE)
+        prefix = mm[:first]
+
+        starts = [first]
+        step = (end - first) // n_parts
+        for k in range(1, n_parts):
+            target = max(first + k * step, starts[-1] + 1)
+            pos = mm.find(RECORD_OPEN, target, end)
+            if pos == -1:
                 break
-
-        mim_gene = get_text(
-            va,
-            ".//Gene/OMIM"
-        )
-
-        mim_disease = None
-        for x in va.findall(".//XRef"):
-            if x.get("DB") == "OMIM" and x.get("Type") == "MIM":
-                mim_disease = x.get("ID")
-                break
-
-        writer.writerow([
-            variation_id,
-            rs_id,
-            gene,
-            variant_type,
-            consequence,
-            chrom,
-            pos,
-            clinical_sig,
-            disease_name,
-            species,
-            mim_gene,
-            mim_disease
-        ])
-
-        va.clear()
-        while va.getprevious() is not None:
-            del va.getparent()[0]
+            if pos != starts[-1]:
+                starts.append(pos)
+
+    bounds = starts + [end]
+    return prefix, list(zip(bounds[:-1], bounds[1:]))
+
+def root_close_tag(prefix):
+    root = prefix.rsplit(b"<", 1)[1]
+    return b"</" + root.split(None, 1)[0].rstrip(b">") + b">"
+
+def extract_range(start, end, prefix, out_path):
+    with open(XML_FILE, "rb") as src, \
+            open(out_path, "w", newline="", buffering=1 << 20) as out:
+        reader = RangeReader(src, start, end, prefix, root_close_tag(prefix))
+        try:
+            parse_records(reader, csv.writer(out))
+        except ET.XMLSyntaxError as e:
+            # XMLSyntaxError can't be pickled back to the parent process,
+            # which would hide the parser message behind MaybeEncodingError
+            raise RuntimeError(f"{out_path} [{start}:{end}]: {e}") from None
+    return out_path
+
+if __name__ == "__main__":
+    prefix, ranges = find_partitions(XML_FILE, N_WORKERS)
+
+    with tempfile.TemporaryDirectory(
+            dir=os.path.dirname(os.path.abspath(OUT_FILE))) as tmp:
+        tasks = [
+            (start, end, prefix, os.path.join(tmp, f"part_{i:04d}.csv"))
+            for i, (start, end) in enumerate(ranges)
+        ]
+        with Pool(min(N_WORKERS, len(tasks) or 1)) as pool:
+            parts = pool.starmap(extract_range, tasks)
+
+        with open(OUT_FILE, "w", newline="", buffering=1 << 20) as f:
+            csv.writer(f).writerow(COLUMNS)
+            for part in parts:
+                with open(part, newline="") as p:
+                    shutil.copyfileobj(p, f, READ_SIZE)
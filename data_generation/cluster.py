@@ -1,9 +1,11 @@
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sklearn.pipeline import make_pipeline
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
 
 INPUT_FILE = "omim_summary.xlsx"
 OUTPUT_EXCEL = "omim_subtypes_clustered.xlsx"
@@ -16,36 +18,46 @@ TEXT_COLUMNS = [
     "Significance / Role"
 ]
 
+N_FEATURES = 2 ** 12
 N_CLUSTERS = 5
 RANDOM_STATE = 42
 DPI = 300
 
 df = pd.read_excel(INPUT_FILE)
 
-df["text_for_clustering"] = (
-    df[TEXT_COLUMNS]
-    .fillna("NA")
-    .agg(" ".join, axis=1)
-)
-
-vectorizer = TfidfVectorizer(
-    stop_words="english",
-    min_df=2,
-    max_features=3000
+text_cols = [df[c].fillna("NA").astype(str) for c in TEXT_COLUMNS]
+df["text_for_clustering"] = text_cols[0].str.cat(text_cols[1:], sep=" ")
+
+# The vocabulary is never inspected, so hash terms straight into a fixed
+# feature space in one pass instead of building a vocabulary first.
+vectorizer = make_pipeline(
+    HashingVectorizer(
+        n_features=N_FEATURES,
+        stop_words="english",
+        alternate_sign=False,
+        norm=None,
+        dtype=np.float32
+    ),
+    TfidfTransformer()
 )
 
+# float32 halves the matrix footprint; KMeans and SVD keep it float32
 X = vectorizer.fit_transform(df["text_for_clustering"])
 
-kmeans = KMeans(
+kmeans = MiniBatchKMeans(
     n_clusters=N_CLUSTERS,
     random_state=RANDOM_STATE,
-    n_init=20
+    batch_size=1024,
+    n_init=3,
+    max_iter=100
 )
 
 df["Cluster"] = kmeans.fit_predict(X)
 
-pca = PCA(n_components=2, random_state=RANDOM_STATE)
-X_2d = pca.fit_transform(X.toarray())
+# TruncatedSVD works on the sparse TF-IDF matrix directly (LSA), so the
+# projection never densifies X.
+svd = TruncatedSVD(n_components=2, random_state=RANDOM_STATE)
+X_2d = svd.fit_transform(X)
 
 plt.figure(figsize=(6, 5))
 
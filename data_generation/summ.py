@@ -1,14 +1,72 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import csv
+import json
+import os
+import re
+import tempfile
+import time
+
+import aiohttp
+from aiolimiter import AsyncLimiter
+from lxml import etree, html
 from pathlib import Path
-from textwrap import wrap
 from openpyxl import Workbook
 
 OLLAMA_URL = "http://localhost:11434/api/generate"
 MODEL = "llama3.1:8b"
 TEMPERATURE = 0.0
 
-CHUNK_SIZE = 1200
+# Chunks are packed by estimated token count so each extraction prompt
+# stays within the model's context without extra calls.
+CHUNK_TOKENS = 600
+CHARS_PER_TOKEN = 4  # rough ratio for English text with LLaMA tokenizers
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# OMIM asks clients to keep request rates modest; Ollama concurrency should
+# match how many requests the local model can batch.
+OMIM_CONCURRENCY = 4
+OLLAMA_CONCURRENCY = 2
+OMIM_SEM = asyncio.Semaphore(OMIM_CONCURRENCY)
+OLLAMA_SEM = asyncio.Semaphore(OLLAMA_CONCURRENCY)
+
+# Requests per second sent to Ollama; tune to the model's observed
+# generation throughput so queued requests don't pile up on the server.
+OLLAMA_RATE = 2
+OLLAMA_LIMITER = AsyncLimiter(max_rate=OLLAMA_RATE, time_period=1)
+
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# OMIM serves UTF-8; without an explicit encoding libxml2 assumes Latin-1
+# for pages that only declare their charset in the HTTP headers.
+HTML_PARSER = html.HTMLParser(encoding="utf-8")
+
+# Visible page text, skipping script/style/noscript content in one pass
+PAGE_TEXT = etree.XPath(
+    ".//text()[not(ancestor::script) and not(ancestor::style)"
+    " and not(ancestor::noscript)]",
+    smart_strings=False
+)
+
+# Raw OMIM pages are kept on disk so re-runs skip the network
+CACHE_DIR = Path("omim_cache")
+CACHE_MAX_AGE = 30 * 24 * 3600  # seconds
+
+POOL_SIZE = 20
+KEEPALIVE_TIMEOUT = 60
+
+SESSION_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+    "Referer": "https://omim.org/",
+    "Upgrade-Insecure-Requests": "1",
+}
 
 MIM_IDS = [
     617892, 614808, 615426, 615515, 616208, 616437, 617921,
@@ -28,57 +86,131 @@ COLUMNS = [
     "MIM Number"
 ]
 
-def ollama_generate(prompt: str) -> str:
-    r = requests.post(
-        OLLAMA_URL,
-        json={
-            "model": MODEL,
-            "prompt": prompt,
-            "stream": False,
-            "options": {"temperature": TEMPERATURE}
-        },
-        timeout=300
-    )
-    r.raise_for_status()
-    return r.json()["response"].strip()
-
-def fetch_omim_text(mim_id: int) -> str:
-    url = f"https://omim.org/entry/{mim_id}"
+async def request_with_backoff(session, method: str, url: str, **kwargs) -> bytes:
+    """Send a request, retrying 429/5xx and connection errors with
+    exponential backoff (honouring Retry-After when given)."""
+    for attempt in range(MAX_RETRIES):
+        last_attempt = attempt == MAX_RETRIES - 1
+        retry_after = None
+        try:
+            async with session.request(method, url, **kwargs) as r:
+                if r.status not in RETRY_STATUSES or last_attempt:
+                    r.raise_for_status()
+                    return await r.read()
+                retry_after = r.headers.get("Retry-After")
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if last_attempt:
+                raise
 
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (X11; Linux x86_64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0.0.0 Safari/537.36"
-        ),
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.5",
-        "Referer": "https://omim.org/",
-        "Connection": "keep-alive",
-        "Upgrade-Insecure-Requests": "1",
-    }
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = BACKOFF_BASE * 2 ** attempt
+        await asyncio.sleep(delay)
 
-    r = requests.get(url, headers=headers, timeout=30)
-    r.raise_for_status()
+async def ollama_generate(session, prompt: str) -> str:
+    async with OLLAMA_SEM, OLLAMA_LIMITER:
+        body = await request_with_backoff(
+            session,
+            "POST",
+            OLLAMA_URL,
+            json={
+                "model": MODEL,
+                "prompt": prompt,
+                "stream": False,
+                "options": {"temperature": TEMPERATURE}
+            },
+            timeout=aiohttp.ClientTimeout(total=300)
+        )
+    return json.loads(body)["response"].strip()
 
-    soup = BeautifulSoup(r.text, "html.parser")
+async def fetch_omim_text(session, mim_id: int) -> str:
+    url = f"https://omim.org/entry/{mim_id}"
+    cache_path = CACHE_DIR / f"{mim_id}.html"
 
-    for tag in soup(["script", "style", "noscript"]):
-        tag.decompose()
+    if (cache_path.exists()
+            and time.time() - cache_path.stat().st_mtime < CACHE_MAX_AGE):
+        body = cache_path.read_bytes()
+    else:
+        async with OMIM_SEM:
+            body = await request_with_backoff(
+                session,
+                "GET",
+                url,
+                timeout=aiohttp.ClientTimeout(total=30)
+            )
+        CACHE_DIR.mkdir(exist_ok=True)
+        # Write then rename so an interrupted run never leaves a truncated
+        # page behind in the cache
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
 
-    main = soup.find("div", {"id": "content"}) or soup.body
-    text = main.get_text(separator="\n")
+    doc = html.fromstring(body, parser=HTML_PARSER)
+    main = doc.get_element_by_id("content", None)
+    if main is None:
+        main = doc.body
+    text = "\n".join(PAGE_TEXT(main))
 
     lines = [l.strip() for l in text.splitlines() if len(l.strip()) > 3]
     return "\n".join(lines)
 
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
 def chunk_text(text: str):
-    return wrap(text, CHUNK_SIZE)
+    """Greedily pack whole sentences into chunks of about CHUNK_TOKENS."""
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append(" ".join(current))
+        current = []
+        current_tokens = 0
+
+    for sentence in SENTENCE_END.split(text):
+        sentence = " ".join(sentence.split())
+        if not sentence:
+            continue
+
+        n = estimate_tokens(sentence)
+        if n <= CHUNK_TOKENS:
+            if current_tokens + n > CHUNK_TOKENS:
+                flush()
+            current.append(sentence)
+            current_tokens += n
+            continue
+
+        # A sentence longer than a whole chunk first tops up the current
+        # chunk, then is split on whitespace into full-size pieces
+        while estimate_tokens(sentence) > CHUNK_TOKENS - current_tokens:
+            width = (CHUNK_TOKENS - current_tokens - 1) * CHARS_PER_TOKEN
+            if width > 0:
+                cut = sentence.rfind(" ", 0, width + 1)
+                if cut <= 0:
+                    cut = width
+                current.append(sentence[:cut])
+                sentence = sentence[cut:].lstrip()
+            flush()
+        if sentence:
+            current.append(sentence)
+            current_tokens += estimate_tokens(sentence)
+
+    flush()
+    return chunks
 
 # -----------------------------
 # Structured extraction
 # -----------------------------
-def extract_rows(chunk: str, mim_id: int):
+async def extract_rows(session, chunk: str, mim_id: int):
     prompt = f"""
 You are an information extraction system for human genetics.
 Extract ONLY facts that are EXPLICITLY stated in the text.
@@ -134,37 +266,57 @@ If a gene is mentioned without a variant, DO NOT create a row.
 TEXT:
 {chunk}
 """
-    raw = ollama_generate(prompt)
+    raw = await ollama_generate(session, prompt)
 
+    # csv.reader keeps quoted commas inside a field. Each line gets its own
+    # reader so an unclosed quote can't pull the following rows into it.
     rows = []
     for line in raw.splitlines():
-        cols = [c.strip() for c in line.split(",")]
+        cols = next(csv.reader([line], skipinitialspace=True), [])
         if len(cols) == 8:
-            rows.append(cols)
+            rows.append([c.strip() for c in cols])
 
     return rows
 
 # -----------------------------
 # Main pipeline
 # -----------------------------
-if __name__ == "__main__":
-    all_rows = []
+async def process_entry(session, mim_id: int):
+    print(f"Fetching OMIM {mim_id}")
+    text = await fetch_omim_text(session, mim_id)
+
+    chunks = chunk_text(text)
+    print(f"  Processing {len(chunks)} chunks for OMIM {mim_id}")
+    results = await asyncio.gather(
+        *(extract_rows(session, chunk, mim_id) for chunk in chunks)
+    )
+    return [row for rows in results for row in rows]
 
-    for mim_id in MIM_IDS:
-        print(f"Fetching OMIM {mim_id}")
-        text = fetch_omim_text(mim_id)
+def make_session():
+    """One pooled keep-alive session shared by the OMIM and Ollama calls."""
+    connector = aiohttp.TCPConnector(
+        limit=POOL_SIZE,
+        limit_per_host=OMIM_CONCURRENCY,
+        keepalive_timeout=KEEPALIVE_TIMEOUT
+    )
+    return aiohttp.ClientSession(connector=connector, headers=SESSION_HEADERS)
+
+async def run_pipeline():
+    async with make_session() as session:
+        results = await asyncio.gather(
+            *(process_entry(session, mim_id) for mim_id in MIM_IDS)
+        )
+    return [row for rows in results for row in rows]
 
-        for i, chunk in enumerate(chunk_text(text)):
-            print(f"  Processing chunk {i+1}")
-            rows = extract_rows(chunk, mim_id)
-            all_rows.extend(rows)
+if __name__ == "__main__":
+    all_rows = asyncio.run(run_pipeline())
 
     # -----------------------------
     # Write XLSX
     # -----------------------------
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "OMIM Summary"
+    # Write-only mode streams rows out instead of building a cell graph
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("OMIM Summary")
 
     ws.append(COLUMNS)
     for row in all_rows:
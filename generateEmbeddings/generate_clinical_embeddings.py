@@ -1,42 +1,80 @@
+from functools import lru_cache
 from transformers import AutoTokenizer, AutoModel
+import os
 import torch
 import numpy as np
 
+MODEL_ID = "microsoft/BiomedNLP-PubMedBERT-base-uncased-abstract-fulltext"
+
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+# bf16 halves memory traffic where the hardware computes it natively;
+# CPUs without bf16 units are faster left in fp32.
+DTYPE = torch.bfloat16 if DEVICE == "cuda" and torch.cuda.is_bf16_supported() else torch.float32
+
 
 def chunk_text(text, tokenizer, max_length=510):
-    """Split text into chunks that fit within token limit"""
+    """Split text into token id chunks that fit within token limit"""
     tokens = tokenizer.encode(text, add_special_tokens=False)
 
-    chunks = []
-    for i in range(0, len(tokens), max_length):
-        chunk = tokens[i:i + max_length]
-        chunks.append(tokenizer.decode(chunk))
-
-    return chunks
+    # Empty text still yields one (empty) chunk, i.e. a bare [CLS] [SEP] input
+    return [tokens[i:i + max_length] for i in range(0, len(tokens), max_length)] or [[]]
 
 
 def encode_long_text(text, tokenizer, model):
     """Encode long text by chunking and averaging embeddings"""
     chunks = chunk_text(text, tokenizer)
 
-    embeddings = []
-    for chunk in chunks:
-        inputs = tokenizer(chunk, return_tensors="pt", truncation=True, max_length=512)
-        with torch.no_grad():
-            outputs = model(**inputs)
-            chunk_embedding = outputs.last_hidden_state[:, 0, :].numpy()
-            embeddings.append(chunk_embedding)
+    # Build the padded batch straight from token ids instead of decoding
+    # each chunk and tokenizing it again
+    chunk_ids = [[tokenizer.cls_token_id] + chunk + [tokenizer.sep_token_id] for chunk in chunks]
+    width = max(len(ids) for ids in chunk_ids)
+    input_ids = torch.full((len(chunk_ids), width), tokenizer.pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros_like(input_ids)
+    for i, ids in enumerate(chunk_ids):
+        input_ids[i, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+        attention_mask[i, :len(ids)] = 1
 
-    # Average all chunk embeddings
-    final_embedding = np.mean(embeddings, axis=0)
+    with torch.inference_mode():
+        outputs = model(input_ids=input_ids.to(model.device), attention_mask=attention_mask.to(model.device))
+
+    # Average all chunk CLS embeddings, accumulating in fp32 without first
+    # copying every chunk to fp32
+    final_embedding = outputs.last_hidden_state[:, 0, :].mean(dim=0, keepdim=True, dtype=torch.float32).cpu().numpy()
 
     return final_embedding
 
 
+@lru_cache(maxsize=None)
+def load_model():
+    """Load the fast tokenizer and compiled model once and keep them resident"""
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_ID, use_fast=True)
+    model = AutoModel.from_pretrained(MODEL_ID, use_safetensors=True, torch_dtype=DTYPE).to(DEVICE)
+    model.eval()
+    return tokenizer, torch.compile(model, mode="reduce-overhead")
+
+
+def embed(text: str) -> np.ndarray:
+    """Return the (1, hidden) embedding of text, chunking past 512 tokens"""
+    tokenizer, model = load_model()
+    # Text that fits in one chunk gives the same CLS + tokens + SEP input
+    # as a plain truncating tokenizer call
+    return encode_long_text(text, tokenizer, model)
+
+
+def configure_threads():
+    """Size the intra-op pool to the machine and keep a single inter-op
+    thread so nested pools don't oversubscribe the cores"""
+    torch.set_num_threads(os.cpu_count() or 1)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Only settable before any parallel work has started
+        pass
+
+
 if __name__ == "__main__":
-    tokenizer = AutoTokenizer.from_pretrained("microsoft/BiomedNLP-PubMedBERT-base-uncased-abstract-fulltext")
-    model = AutoModel.from_pretrained("microsoft/BiomedNLP-PubMedBERT-base-uncased-abstract-fulltext",
-                                      use_safetensors=True)
+    configure_threads()
+    tokenizer, _ = load_model()
 
     omim_description = """
     Amyotrophic lateral sclerosis-18 (ALS18) is caused by heterozygous mutation in the PFN1 gene (176610) on chromosome 17p13.
@@ -51,13 +89,9 @@ if __name__ == "__main__":
 
     if len(tokens) > 512:
         print("⚠️ Text exceeds 512 tokens - using chunking strategy")
-        embedding = encode_long_text(omim_description, tokenizer, model)
     else:
         print("✓ Text fits within limit")
-        inputs = tokenizer(omim_description, return_tensors="pt", truncation=True, max_length=512)
-        with torch.no_grad():
-            outputs = model(**inputs)
-            embedding = outputs.last_hidden_state[:, 0, :].numpy()
+    embedding = embed(omim_description)
 
     print("Embedding: ")
     print(embedding)